@@ -2,16 +2,56 @@
 Cache-System für Geocoding-Ergebnisse
 """
 
-import json
-import hashlib
+import time
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict
-from datetime import datetime, timedelta
+from typing import Optional, Dict, Tuple
+from datetime import datetime
+
+import jsonutil
+
+
+def _spread_bits(x: int) -> int:
+    x &= 0xFFFFFFFF
+    x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x << 2)) & 0x3333333333333333
+    x = (x | (x << 1)) & 0x5555555555555555
+    return x
+
+
+def interleave32(lat_q: int, lon_q: int) -> int:
+    """Morton-Code: Breitengrad auf ungeraden, Längengrad auf geraden Bits"""
+    return (_spread_bits(lat_q) << 1) | _spread_bits(lon_q)
+
+
+# Umrechnung von Grad in das 32-Bit-Raster
+_LAT_SCALE = (1 << 32) / 180.0
+_LON_SCALE = (1 << 32) / 360.0
+
+
+def morton_key(lat: float, lon: float, shift: int, prefix: int) -> int:
+    """Cache-Schlüssel aus Rasterverschiebung und Genauigkeits-Präfix"""
+    lat_q = min(max(int((lat + 90.0) * _LAT_SCALE), 0), 0xFFFFFFFF) >> shift
+    lon_q = min(max(int((lon + 180.0) * _LON_SCALE), 0), 0xFFFFFFFF) >> shift
+    return prefix | interleave32(lat_q, lon_q)
 
 
 class GeocodingCache:
     """Cache für Geocodierung-Ergebnisse"""
     
+    # Maximaler Abstand zwischen zwei Commits in Sekunden bzw. Einträgen
+    FLUSH_INTERVAL = 5.0
+    FLUSH_EVERY = 100
+    # Nach dieser Zeit werden die Statistik-Zähler neu ermittelt
+    RECOUNT_INTERVAL = 60.0
+    # Anzahl zuletzt genutzter Einträge, die im Speicher gehalten werden
+    HOT_CACHE_SIZE = 1024
+    
     PRECISION_LEVELS = {
         3: {'name': '3 Dezimalstellen', 'accuracy': '~111m', 'description': 'Stadtteile/große Bereiche'},
         4: {'name': '4 Dezimalstellen', 'accuracy': '~11m', 'description': 'Straßenabschnitte'},
@@ -20,146 +60,330 @@ class GeocodingCache:
         7: {'name': '7 Dezimalstellen', 'accuracy': '~0.01m', 'description': 'Maximale Genauigkeit'},
     }
     
+    # Bits pro Koordinate, deren Rasterweite der jeweiligen Dezimalstelle entspricht
+    PRECISION_BITS = {3: 18, 4: 21, 5: 25, 6: 28, 7: 30}
+    
     def __init__(self, cache_file: Path = None, precision: int = 5, max_age_days: int = 30):
         if cache_file is None:
             cache_dir = Path.home() / '.geotagger'
             cache_dir.mkdir(exist_ok=True)
-            self.cache_file = cache_dir / 'geocoding_cache.json'
+            self.cache_file = cache_dir / 'geocoding_cache.sqlite'
         else:
             self.cache_file = cache_file
         
-        self.cache_data = {}
         self.cache_max_age_days = max_age_days
-        self.precision = precision
+        self._max_age_seconds = max_age_days * 86400
+        self._hot = OrderedDict()
+        self.precision = 5
+        self.precision_bits = self.PRECISION_BITS[5]
+        self._precision_info = self.PRECISION_LEVELS[5]
+        self._key_params = self._key_params_for(5)
+        self.set_precision(precision)
+        self._dirty = False
+        self._dirty_count = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        self._valid_count = 0
+        self._expired_count = 0
+        self._counts_stale = True
+        self._last_recount = 0.0
         self.load_cache()
+        atexit.register(self.close)
     
     def set_precision(self, precision: int):
         if precision in self.PRECISION_LEVELS:
             self.precision = precision
+            self.precision_bits = self.PRECISION_BITS[precision]
+            self._precision_info = self.PRECISION_LEVELS[precision]
+            # Für _generate_cache_key vorberechnen, die Genauigkeit ändert sich selten.
+            # Ein Tupel, damit laufende Threads nie Raster und Präfix mischen
+            self._key_params = self._key_params_for(precision)
     
     def set_max_age_days(self, days: int):
         if days > 0:
             self.cache_max_age_days = days
+            self._max_age_seconds = days * 86400
+            self._counts_stale = True
     
     def get_precision_info(self) -> Dict[str, str]:
-        return self.PRECISION_LEVELS.get(self.precision, self.PRECISION_LEVELS[5])
+        return self._precision_info
+    
+    def _generate_cache_key(self, lat: float, lon: float) -> int:
+        return morton_key(lat, lon, *self._key_params)
     
-    def _generate_cache_key(self, lat: float, lon: float) -> str:
-        lat_rounded = round(lat, self.precision)
-        lon_rounded = round(lon, self.precision)
-        key = f"{lat_rounded},{lon_rounded}"
-        return hashlib.md5(key.encode()).hexdigest()
+    @classmethod
+    def _key_params_for(cls, precision: int) -> Tuple[int, int]:
+        # Genauigkeit in den oberen Bits, damit sich Raster nicht überschneiden
+        return 32 - cls.PRECISION_BITS[precision], precision << 60
+    
+    @classmethod
+    def _key_for_precision(cls, lat: float, lon: float, precision: int) -> int:
+        return morton_key(lat, lon, *cls._key_params_for(precision))
     
     def load_cache(self):
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.cache_data = json.load(f)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Warnung: Cache konnte nicht geladen werden: {e}")
-                self.cache_data = {}
+        self._conn = sqlite3.connect(str(self.cache_file), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key INTEGER PRIMARY KEY, ts REAL NOT NULL, data BLOB NOT NULL, '
+            'lat REAL, lon REAL, precision INTEGER)'
+        )
+        # Datenbanken älterer Versionen um neue Spalten ergänzen
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(cache)')}
+        for column, column_type in (('lat', 'REAL'), ('lon', 'REAL'), ('precision', 'INTEGER')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE cache ADD COLUMN {column} {column_type}')
+        # Ablauf-Abfragen laufen über den Zeitstempel statt über die ganze Tabelle
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_ts ON cache (ts)')
+        # Bereits getaggte Bilder, erkannt an Pfad, Änderungszeit und Größe
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS tagged ('
+            'path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL)'
+        )
+        self._conn.commit()
+        
+        for legacy_file in (self.cache_file.with_suffix('.jsonl'), self.cache_file.with_suffix('.json')):
+            if legacy_file.exists():
+                self._import_legacy_cache(legacy_file)
     
-    def save_cache(self):
+    def _import_legacy_cache(self, legacy_file: Path):
+        entries = {}
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache_data, f, ensure_ascii=False, indent=2)
-        except IOError as e:
-            print(f"Warnung: Cache konnte nicht gespeichert werden: {e}")
+            with open(legacy_file, 'rb') as f:
+                if legacy_file.suffix == '.jsonl':
+                    for line in f:
+                        try:
+                            obj = jsonutil.loads(line)
+                            entries[obj['k']] = obj['v']
+                        except (jsonutil.JSONDecodeError, KeyError, TypeError):
+                            # z.B. abgeschnittene letzte Zeile nach Absturz
+                            continue
+                else:
+                    entries = jsonutil.loads(f.read())
+        except (jsonutil.JSONDecodeError, IOError) as e:
+            print(f"Warnung: Alter Cache konnte nicht übernommen werden: {e}")
+            return
+        
+        for entry in entries.values():
+            self._upgrade_entry(entry)
+        self._rekey_legacy_entries(entries)
+        
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO cache (key, ts, data, lat, lon, precision) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        key, entry['ts'], jsonutil.dumps(entry.get('location_data')),
+                        entry.get('coordinates', {}).get('lat'),
+                        entry.get('coordinates', {}).get('lon'),
+                        key >> 60
+                    )
+                    for key, entry in entries.items()
+                    if isinstance(key, int)
+                )
+            )
+            self._conn.commit()
+        legacy_file.replace(legacy_file.with_suffix(legacy_file.suffix + '.bak'))
+    
+    @staticmethod
+    def _upgrade_entry(entry: Dict) -> Dict:
+        # Ältere Einträge speichern den Zeitstempel als ISO-String
+        if 'ts' not in entry:
+            try:
+                entry['ts'] = datetime.fromisoformat(entry.pop('timestamp')).timestamp()
+            except (KeyError, ValueError, TypeError):
+                entry['ts'] = 0.0
+        return entry
+    
+    @classmethod
+    def _rekey_legacy_entries(cls, entries: Dict) -> int:
+        # Ältere Einträge sind über MD5-Hashes adressiert; der Schlüssel
+        # lässt sich aus den gespeicherten Koordinaten neu berechnen
+        legacy_keys = [key for key in entries if isinstance(key, str)]
+        for key in legacy_keys:
+            entry = entries.pop(key)
+            try:
+                coords = entry['coordinates']
+                new_key = cls._key_for_precision(coords['lat'], coords['lon'], entry['precision'])
+            except (KeyError, TypeError):
+                continue
+            if new_key not in entries:
+                entries[new_key] = entry
+        return len(legacy_keys)
+    
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._conn.commit()
+            self._dirty = False
+            self._dirty_count = 0
+            self._last_flush = time.monotonic()
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self.flush()
+                self._conn.close()
+                self._conn = None
+    
+    def _maybe_flush(self):
+        if (self._dirty_count >= self.FLUSH_EVERY
+                or time.monotonic() - self._last_flush > self.FLUSH_INTERVAL):
+            self.flush()
     
     def get(self, lat: float, lon: float) -> Optional[Dict[str, str]]:
         cache_key = self._generate_cache_key(lat, lon)
         
-        if cache_key not in self.cache_data:
-            return None
+        with self._lock:
+            hot_entry = self._hot.get(cache_key)
+            if hot_entry is not None:
+                self._hot.move_to_end(cache_key)
+                ts, location_data = hot_entry
+            else:
+                row = self._conn.execute(
+                    'SELECT ts, data FROM cache WHERE key = ?', (cache_key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                ts, location_data = row[0], jsonutil.loads(row[1])
+                self._remember(cache_key, ts, location_data)
         
-        cache_entry = self.cache_data[cache_key]
-        timestamp_str = cache_entry.get('timestamp')
-        if not timestamp_str:
+        if time.time() - ts > self._max_age_seconds:
             return None
         
-        try:
-            timestamp = datetime.fromisoformat(timestamp_str)
-            age = datetime.now() - timestamp
-            
-            if age > timedelta(days=self.cache_max_age_days):
-                return None
-            
-            return cache_entry.get('location_data')
-        except (ValueError, TypeError):
-            return None
+        return location_data
     
-    def set(self, lat: float, lon: float, location_data: Dict[str, str]):
+    def _remember(self, cache_key: int, ts: float, location_data: Dict[str, str]):
+        self._hot[cache_key] = (ts, location_data)
+        self._hot.move_to_end(cache_key)
+        if len(self._hot) > self.HOT_CACHE_SIZE:
+            self._hot.popitem(last=False)
+    
+    def set(self, lat: float, lon: float, location_data: Dict[str, str],
+            coordinates: Optional[Tuple[float, float]] = None):
         cache_key = self._generate_cache_key(lat, lon)
+        if coordinates is None:
+            coordinates = (lat, lon)
+        now = time.time()
+        data = jsonutil.dumps(location_data)
         
-        self.cache_data[cache_key] = {
-            'timestamp': datetime.now().isoformat(),
-            'coordinates': {
-                'lat': round(lat, self.precision),
-                'lon': round(lon, self.precision)
-            },
-            'precision': self.precision,
-            'location_data': location_data
-        }
-        
-        self.save_cache()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT ts, data FROM cache WHERE key = ?', (cache_key,)
+            ).fetchone()
+            unchanged = row is not None and row[1] == data
+            if row is None:
+                self._valid_count += 1
+            elif now - row[0] > self._max_age_seconds:
+                self._expired_count -= 1
+                self._valid_count += 1
+            
+            if unchanged:
+                self._conn.execute('UPDATE cache SET ts = ? WHERE key = ?', (now, cache_key))
+            else:
+                self._conn.execute(
+                    'INSERT INTO cache (key, ts, data, lat, lon, precision) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET '
+                    'ts = excluded.ts, data = excluded.data, lat = excluded.lat, lon = excluded.lon',
+                    (cache_key, now, data, coordinates[0], coordinates[1], cache_key >> 60)
+                )
+            self._remember(cache_key, now, location_data)
+            self._dirty = True
+            self._dirty_count += 1
+            self._maybe_flush()
+    
+    def is_tagged(self, path: str, mtime_ns: int, size: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM tagged WHERE path = ? AND mtime_ns = ? AND size = ?',
+                (path, mtime_ns, size)
+            ).fetchone()
+        return row is not None
+    
+    def set_tagged(self, path: str, mtime_ns: int, size: int):
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO tagged (path, mtime_ns, size) VALUES (?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns, size = excluded.size',
+                (path, mtime_ns, size)
+            )
+            self._dirty = True
+            self._dirty_count += 1
+            self._maybe_flush()
     
     def clear_old_entries(self, max_age_days: int = None):
         if max_age_days is None:
             max_age_days = self.cache_max_age_days
         
-        now = datetime.now()
-        keys_to_delete = []
-        
-        for key, entry in self.cache_data.items():
-            timestamp_str = entry.get('timestamp')
-            if timestamp_str:
-                try:
-                    timestamp = datetime.fromisoformat(timestamp_str)
-                    age = now - timestamp
-                    
-                    if age > timedelta(days=max_age_days):
-                        keys_to_delete.append(key)
-                except (ValueError, TypeError):
-                    keys_to_delete.append(key)
+        cutoff = time.time() - max_age_days * 86400
+        with self._lock:
+            deleted = self._conn.execute('DELETE FROM cache WHERE ts < ?', (cutoff,)).rowcount
+            self._conn.commit()
+            self._dirty = False
+            
+            if max_age_days == self.cache_max_age_days:
+                self._expired_count = max(self._expired_count - deleted, 0)
+            else:
+                self._counts_stale = True
+            
+            if deleted:
+                self._hot.clear()
+                self._shrink_if_sparse()
         
-        for key in keys_to_delete:
-            del self.cache_data[key]
+        return deleted
+    
+    def _shrink_if_sparse(self):
+        # Nach größeren Löschungen freie Seiten zurückgeben, damit die Datei
+        # und spätere Scans nicht an Leerraum hängen
+        page_count = self._conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist_count = self._conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if freelist_count > page_count // 4:
+            self._conn.execute('VACUUM')
+    
+    def clear_all(self):
+        with self._lock:
+            # DELETE ohne WHERE nutzt SQLites Truncate-Optimierung
+            self._conn.execute('DELETE FROM cache')
+            self._conn.execute('DELETE FROM tagged')
+            self._conn.commit()
+            self._dirty = False
+            self._valid_count = 0
+            self._expired_count = 0
+            self._counts_stale = False
+            self._last_recount = time.monotonic()
+            self._hot.clear()
+            self._shrink_if_sparse()
+    
+    def _recount_if_stale(self):
+        if (not self._counts_stale
+                and time.monotonic() - self._last_recount < self.RECOUNT_INTERVAL):
+            return
         
-        if keys_to_delete:
-            self.save_cache()
+        cutoff = time.time() - self._max_age_seconds
+        with self._lock:
+            total = self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            valid = self._conn.execute(
+                'SELECT COUNT(*) FROM cache WHERE ts >= ?', (cutoff,)
+            ).fetchone()[0]
         
-        return len(keys_to_delete)
+        self._valid_count = valid
+        self._expired_count = total - valid
+        self._counts_stale = False
+        self._last_recount = time.monotonic()
     
     def get_stats(self) -> Dict[str, any]:
-        total_entries = len(self.cache_data)
-        
-        now = datetime.now()
-        valid_entries = 0
-        expired_entries = 0
-        
-        for entry in self.cache_data.values():
-            timestamp_str = entry.get('timestamp')
-            if timestamp_str:
-                try:
-                    timestamp = datetime.fromisoformat(timestamp_str)
-                    age = now - timestamp
-                    
-                    if age <= timedelta(days=self.cache_max_age_days):
-                        valid_entries += 1
-                    else:
-                        expired_entries += 1
-                except (ValueError, TypeError):
-                    expired_entries += 1
-        
+        self._recount_if_stale()
         precision_info = self.get_precision_info()
         
         return {
-            'total': total_entries,
-            'valid': valid_entries,
-            'expired': expired_entries,
+            'total': self._valid_count + self._expired_count,
+            'valid': self._valid_count,
+            'expired': self._expired_count,
             'cache_file': str(self.cache_file),
             'max_age_days': self.cache_max_age_days,
             'precision': self.precision,
             'precision_name': precision_info['name'],
             'precision_accuracy': precision_info['accuracy']
-        }
\ No newline at end of file
+        }
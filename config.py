@@ -2,17 +2,23 @@
 Konfigurationsverwaltung für Geo-Tagger
 """
 
-import json
-from typing import List
+from typing import FrozenSet, Iterable
 from pathlib import Path
 from PyQt6.QtCore import QSettings
 
+import jsonutil
+
 
 class Config:
     """Konfigurationsverwaltung"""
     
     def __init__(self):
-        self.settings = QSettings('GeoTagger', 'GeoTagger')
+        # INI-Datei statt Registry/plist: ein Dateizugriff statt Einzelabfragen
+        self.settings = QSettings(
+            QSettings.Format.IniFormat, QSettings.Scope.UserScope, 'GeoTagger', 'GeoTagger'
+        )
+        if not self.settings.allKeys():
+            self._migrate_native_settings()
         self.default_exiftool_path = 'exiftool'
         self.default_file_types = [
             '.jpg', '.jpeg', '.png', '.tiff', '.tif',
@@ -20,42 +26,85 @@ class Config:
         ]
         self.default_cache_precision = 5
         self.default_cache_max_age_days = 30
+        # Bereits gelesene Werte, damit QSettings nicht bei jedem Aufruf gelesen wird
+        self._cache = {}
+        self.get_exiftool_path()
+        self.get_file_types()
+        self.get_last_directory()
+        self.get_cache_precision()
+        self.get_cache_max_age_days()
+        self.get_skip_if_exists()
+    
+    def _migrate_native_settings(self):
+        native = QSettings('GeoTagger', 'GeoTagger')
+        for key in native.allKeys():
+            self.settings.setValue(key, native.value(key))
+        self.settings.sync()
+    
+    def _set(self, key: str, value, cached_value=None):
+        self.settings.setValue(key, value)
+        self._cache[key] = value if cached_value is None else cached_value
     
     def get_exiftool_path(self) -> str:
-        return self.settings.value('exiftool_path', self.default_exiftool_path)
+        if 'exiftool_path' not in self._cache:
+            self._cache['exiftool_path'] = self.settings.value('exiftool_path', self.default_exiftool_path)
+        return self._cache['exiftool_path']
     
     def set_exiftool_path(self, path: str):
-        self.settings.setValue('exiftool_path', path)
+        self._set('exiftool_path', path)
     
-    def get_file_types(self) -> List[str]:
-        types = self.settings.value('file_types', self.default_file_types)
-        if isinstance(types, str):
-            types = json.loads(types)
-        return types
+    def get_file_types(self) -> FrozenSet[str]:
+        if 'file_types' not in self._cache:
+            types = self.settings.value('file_types', self.default_file_types)
+            if types is None:
+                types = []
+            elif isinstance(types, str):
+                if types.startswith('['):
+                    # Ältere Versionen speichern die Liste als JSON-String
+                    types = jsonutil.loads(types)
+                    self.settings.setValue('file_types', types)
+                else:
+                    # QSettings liefert einelementige Listen als String zurück
+                    types = [types] if types else []
+            self._cache['file_types'] = frozenset(t.lower() for t in types)
+        return self._cache['file_types']
     
-    def set_file_types(self, types: List[str]):
-        self.settings.setValue('file_types', json.dumps(types))
+    def set_file_types(self, types: Iterable[str]):
+        types = frozenset(t.lower() for t in types)
+        self._set('file_types', sorted(types), types)
     
     def get_last_directory(self) -> str:
-        return self.settings.value('last_directory', str(Path.home()))
+        if 'last_directory' not in self._cache:
+            self._cache['last_directory'] = self.settings.value('last_directory', str(Path.home()))
+        return self._cache['last_directory']
     
     def set_last_directory(self, directory: str):
-        self.settings.setValue('last_directory', directory)
+        self._set('last_directory', directory)
     
     def get_cache_precision(self) -> int:
-        return int(self.settings.value('cache_precision', self.default_cache_precision))
+        if 'cache_precision' not in self._cache:
+            self._cache['cache_precision'] = int(
+                self.settings.value('cache_precision', self.default_cache_precision)
+            )
+        return self._cache['cache_precision']
     
     def set_cache_precision(self, precision: int):
-        self.settings.setValue('cache_precision', precision)
+        self._set('cache_precision', precision)
     
     def get_cache_max_age_days(self) -> int:
-        return int(self.settings.value('cache_max_age_days', self.default_cache_max_age_days))
+        if 'cache_max_age_days' not in self._cache:
+            self._cache['cache_max_age_days'] = int(
+                self.settings.value('cache_max_age_days', self.default_cache_max_age_days)
+            )
+        return self._cache['cache_max_age_days']
     
     def set_cache_max_age_days(self, days: int):
-        self.settings.setValue('cache_max_age_days', days)
+        self._set('cache_max_age_days', days)
     
     def get_skip_if_exists(self) -> bool:
-        return self.settings.value('skip_if_exists', True, type=bool)
+        if 'skip_if_exists' not in self._cache:
+            self._cache['skip_if_exists'] = self.settings.value('skip_if_exists', True, type=bool)
+        return self._cache['skip_if_exists']
     
     def set_skip_if_exists(self, skip: bool):
-        self.settings.setValue('skip_if_exists', skip)
\ No newline at end of file
+        self._set('skip_if_exists', skip)
\ No newline at end of file
@@ -7,6 +7,7 @@ from PyQt6.QtWidgets import (
     QLineEdit, QGroupBox, QComboBox, QSpinBox, QCheckBox,
     QScrollArea, QWidget, QMessageBox, QFileDialog
 )
+from PyQt6.QtCore import QTimer
 
 from config import Config
 from cache import GeocodingCache
@@ -15,6 +16,12 @@ from cache import GeocodingCache
 class ConfigDialog(QDialog):
     """Konfigurationsdialog"""
     
+    ALL_FILE_TYPES = (
+        '.jpg', '.jpeg', '.png', '.tiff', '.tif',
+        '.dng', '.raw', '.cr2', '.nef', '.arw',
+        '.orf', '.rw2', '.pef', '.srw', '.raf'
+    )
+    
     def __init__(self, config: Config, cache: GeocodingCache, parent=None):
         super().__init__(parent)
         self.config = config
@@ -106,17 +113,10 @@ class ConfigDialog(QDialog):
         cache_group = QGroupBox('Cache-Informationen')
         cache_layout = QVBoxLayout()
         
-        cache_stats = self.cache.get_stats()
-        
-        stats_text = f"""<b>Cache-Datei:</b> {cache_stats['cache_file']}<br>
-<b>Aktuelle Genauigkeit:</b> {cache_stats['precision_name']} ({cache_stats['precision_accuracy']})<br>
-<b>Aktuelle Lebensdauer:</b> {cache_stats['max_age_days']} Tage<br>
-<b>Gesamt-Einträge:</b> {cache_stats['total']}<br>
-<b>Gültige Einträge:</b> {cache_stats['valid']}<br>
-<b>Abgelaufene Einträge:</b> {cache_stats['expired']}"""
-        
-        self.stats_label = QLabel(stats_text)
+        # Statistiken erst nach dem Anzeigen des Dialogs ermitteln
+        self.stats_label = QLabel('Lade Cache-Statistiken…')
         self.stats_label.setWordWrap(True)
+        QTimer.singleShot(0, self.update_stats_display)
         cache_layout.addWidget(self.stats_label)
         
         cache_button_layout = QHBoxLayout()
@@ -142,24 +142,21 @@ class ConfigDialog(QDialog):
         scroll.setWidgetResizable(True)
         scroll.setMaximumHeight(120)
         scroll_widget = QWidget()
+        scroll_widget.setUpdatesEnabled(False)
         scroll_layout = QVBoxLayout()
         
         self.filetype_checkboxes = {}
-        all_types = [
-            '.jpg', '.jpeg', '.png', '.tiff', '.tif',
-            '.dng', '.raw', '.cr2', '.nef', '.arw',
-            '.orf', '.rw2', '.pef', '.srw', '.raf'
-        ]
-        
         selected_types = self.config.get_file_types()
         
-        for ftype in all_types:
+        # Layout erst nach dem Befüllen zuweisen, damit nicht pro Checkbox neu gelayoutet wird
+        for ftype in self.ALL_FILE_TYPES:
             cb = QCheckBox(ftype.upper())
             cb.setChecked(ftype in selected_types)
             self.filetype_checkboxes[ftype] = cb
             scroll_layout.addWidget(cb)
         
         scroll_widget.setLayout(scroll_layout)
+        scroll_widget.setUpdatesEnabled(True)
         scroll.setWidget(scroll_widget)
         filetype_layout.addWidget(scroll)
         
@@ -216,8 +213,7 @@ class ConfigDialog(QDialog):
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            self.cache.cache_data = {}
-            self.cache.save_cache()
+            self.cache.clear_all()
             QMessageBox.information(
                 self, 'Cache geleert',
                 'Der Cache wurde vollständig geleert.'
@@ -0,0 +1,88 @@
+"""
+Dauerhafte ExifTool-Sitzung im -stay_open-Modus
+"""
+
+import queue
+import subprocess
+import threading
+from typing import Optional
+
+
+class ExifToolSession:
+    """Hält einen ExifTool-Prozess offen und führt Befehle über stdin aus"""
+    
+    def __init__(self, exiftool_path: str):
+        self.exiftool_path = exiftool_path
+        self._process: Optional[subprocess.Popen] = None
+        self._lines: Optional[queue.Queue] = None
+        self._command_id = 0
+    
+    def _start(self):
+        self._process = subprocess.Popen(
+            [
+                self.exiftool_path,
+                '-stay_open', 'True',
+                '-@', '-',
+                '-common_args', '-charset', 'filename=utf8'
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            errors='replace'
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(
+            target=self._read_stdout,
+            args=(self._process.stdout, self._lines),
+            daemon=True
+        )
+        reader.start()
+    
+    @staticmethod
+    def _read_stdout(stdout, lines: queue.Queue):
+        for line in stdout:
+            lines.put(line)
+        lines.put(None)
+    
+    def execute(self, *args: str, timeout: float = 30) -> str:
+        if self._process is None or self._process.poll() is not None:
+            self._start()
+        
+        self._command_id += 1
+        sentinel = f'{{ready{self._command_id}}}'
+        
+        self._process.stdin.write('\n'.join(args) + f'\n-execute{self._command_id}\n')
+        self._process.stdin.flush()
+        
+        output = []
+        while True:
+            try:
+                line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                # Prozess hängt: beim nächsten Aufruf neu starten
+                self._kill()
+                raise subprocess.TimeoutExpired(self.exiftool_path, timeout)
+            
+            if line is None:
+                self._process = None
+                raise RuntimeError('ExifTool wurde unerwartet beendet')
+            if line.rstrip() == sentinel:
+                return ''.join(output)
+            output.append(line)
+    
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process = None
+    
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.write('-stay_open\nFalse\n')
+            self._process.stdin.flush()
+            self._process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._process = None
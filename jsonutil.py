@@ -0,0 +1,25 @@
+"""
+JSON-Serialisierung mit orjson, sofern installiert
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    loads = json.loads
@@ -4,12 +4,12 @@ Hauptfenster für Geo-Tagger
 
 import os
 from PyQt6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QFileDialog,
     QTextEdit, QProgressBar, QGroupBox, QCheckBox,
     QMessageBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui import QFont
 
 from config import Config
@@ -21,6 +21,9 @@ from dialogs import ConfigDialog
 class MainWindow(QMainWindow):
     """Hauptfenster der Anwendung"""
     
+    # Log-Ausgaben werden gesammelt und höchstens in diesem Abstand angezeigt
+    LOG_UPDATE_INTERVAL_MS = 100
+    
     def __init__(self):
         super().__init__()
         self.config = Config()
@@ -29,6 +32,12 @@ class MainWindow(QMainWindow):
             max_age_days=self.config.get_cache_max_age_days()
         )
         self.worker = None
+        self._log_buffer = []
+        self._log_timer = QTimer(self)
+        self._log_timer.setSingleShot(True)
+        self._log_timer.setInterval(self.LOG_UPDATE_INTERVAL_MS)
+        self._log_timer.timeout.connect(self.flush_log)
+        QApplication.instance().aboutToQuit.connect(self.cache.flush)
         self.setWindowTitle('Geo-Tagger - Automatische Reverse-Geocodierung')
         self.resize(800, 650)
         self.init_ui()
@@ -217,6 +226,7 @@ class MainWindow(QMainWindow):
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
         self.skip_existing_checkbox.setEnabled(False)
+        self._log_buffer.clear()
         self.log_text.clear()
         self.progress_bar.setValue(0)
         
@@ -235,16 +245,35 @@ class MainWindow(QMainWindow):
             self.stop_btn.setEnabled(False)
     
     def update_progress(self, current: int, total: int):
-        self.progress_bar.setMaximum(total)
+        # total=0 während der Dateisuche: Maximum 0 zeigt einen Laufbalken
+        if total != self.progress_bar.maximum():
+            self.progress_bar.setMaximum(total)
         self.progress_bar.setValue(current)
-        self.progress_label.setText(f'{current} von {total} Dateien')
+        if total:
+            self.progress_label.setText(f'{current} von {total} Dateien')
+        else:
+            self.progress_label.setText(f'{current} Dateien verarbeitet, Suche läuft...')
     
     def append_log(self, message: str):
-        self.log_text.append(message)
+        self._log_buffer.append(message)
+        if not self._log_timer.isActive():
+            self._log_timer.start()
+    
+    def flush_log(self):
+        self._log_timer.stop()
+        if not self._log_buffer:
+            return
+        self.log_text.append('\n'.join(self._log_buffer))
+        self._log_buffer.clear()
         scrollbar = self.log_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
     
     def processing_finished(self):
+        self.flush_log()
+        if self.progress_bar.maximum() == 0:
+            # Laufbalken der Dateisuche beenden, falls keine Gesamtzahl mehr kam
+            self.progress_bar.setMaximum(1)
+            self.progress_bar.setValue(0)
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
         self.skip_existing_checkbox.setEnabled(True)
@@ -252,8 +281,13 @@ class MainWindow(QMainWindow):
         self.update_cache_info()
     
     def show_error(self, error_msg: str):
+        self.flush_log()
         QMessageBox.critical(self, 'Fehler', error_msg)
         self.processing_finished()
     
     def show_cache_stats(self, stats: dict):
-        self.update_cache_info()
\ No newline at end of file
+        self.update_cache_info()
+    
+    def closeEvent(self, event):
+        self.cache.flush()
+        super().closeEvent(event)
\ No newline at end of file
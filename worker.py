@@ -3,15 +3,25 @@ Worker-Thread für die Geocodierung
 """
 
 import os
+import re
+import time
+import functools
+import threading
 import subprocess
-import requests
 from pathlib import Path
-from typing import Optional, Tuple, List, Dict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Optional, Tuple, List, Dict, FrozenSet, Iterator, TYPE_CHECKING
 
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from config import Config
 from cache import GeocodingCache
+from exiftool import ExifToolSession
+
+import jsonutil
+
+if TYPE_CHECKING:
+    import requests
 
 
 class GeocodingWorker(QThread):
@@ -23,6 +33,18 @@ class GeocodingWorker(QThread):
     error = pyqtSignal(str)
     cache_stats = pyqtSignal(dict)
     
+    # Log-Zeilen werden gesammelt und höchstens in diesem Abstand gesendet
+    LOG_FLUSH_INTERVAL = 0.05
+    # Fortschrittsbalken höchstens ~30x pro Sekunde aktualisieren
+    PROGRESS_INTERVAL = 1 / 30
+    # Anzahl parallel verarbeiteter Dateien, jeweils mit eigenem ExifTool-Prozess
+    MAX_WORKERS = 4
+    
+    PHOTON_URL = 'https://photon.komoot.io/reverse'
+    USER_AGENT = 'ReverseGeoTagger/0.5.0'
+    # Längste Wartezeit nach Retry-After, solange die Photon-Sperre gehalten wird
+    MAX_RETRY_AFTER = 30
+    
     def __init__(self, directory: str, config: Config, cache: GeocodingCache, skip_existing: bool):
         super().__init__()
         self.directory = directory
@@ -30,6 +52,19 @@ class GeocodingWorker(QThread):
         self.cache = cache
         self.skip_existing = skip_existing
         self.should_stop = False
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.RLock()
+        self._api_lock = threading.Lock()
+        # Ortsdaten je gerundeter Position, auch für noch laufende Abfragen
+        self._locations: Dict[Tuple[float, float], Future] = {}
+        # Bilder mit XMP-Sidecar -> (Pfad des Sidecars, Sidecar ist neuer als das Bild)
+        self._sidecars: Dict[str, Tuple[str, bool]] = {}
+        self.http = None
+        self._log_buffer = []
+        self._last_log_flush = 0.0
+        self._files_done = 0
+        self._last_progress = 0.0
         self.stats = {
             'cache_hits': 0,
             'api_calls': 0,
@@ -42,198 +77,343 @@ class GeocodingWorker(QThread):
     
     def run(self):
         try:
-            self.log.emit('Suche nach Bilddateien...')
-            image_files = self.find_image_files()
-            
-            if not image_files:
-                self.log.emit('Keine Bilddateien gefunden.')
-                self.finished.emit()
-                return
-            
-            self.log.emit(f'{len(image_files)} Bilddatei(en) gefunden.')
+            # Fehlt requests, soll das wie jeder andere Fehler gemeldet werden
+            self.http = self._create_http_session()
             
             precision_info = self.cache.get_precision_info()
-            self.log.emit(f'Cache-Genauigkeit: {precision_info["name"]} ({precision_info["accuracy"]})')
-            self.log.emit(f'Cache-Lebensdauer: {self.cache.cache_max_age_days} Tage')
+            self._log(f'Cache-Genauigkeit: {precision_info["name"]} ({precision_info["accuracy"]})')
+            self._log(f'Cache-Lebensdauer: {self.cache.cache_max_age_days} Tage')
             
             if self.skip_existing:
-                self.log.emit('⚡ Bereits getaggte Bilder werden übersprungen')
+                self._log('⚡ Bereits getaggte Bilder werden übersprungen')
             
-            self.log.emit('─' * 60)
+            self._log('Suche nach Bilddateien...')
+            self._log('─' * 60)
             
-            for i, image_file in enumerate(image_files):
-                if self.should_stop:
-                    self.log.emit('Abgebrochen.')
-                    break
+            total = 0
+            futures = []
+            executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+            try:
+                # Dateien schon während der Suche verarbeiten; solange die Gesamtzahl
+                # unbekannt ist, wird der Fortschritt mit total=0 gemeldet
+                for image_file in self.find_image_files():
+                    if self.should_stop:
+                        break
+                    future = executor.submit(self.process_image, image_file)
+                    future.add_done_callback(self._file_done)
+                    futures.append(future)
+                    self._report_progress(0)
+                    self._flush_log_if_due()
                 
-                self.progress.emit(i + 1, len(image_files))
-                self.process_image(image_file)
+                total = len(futures)
+                if futures and not self.should_stop:
+                    self._log(f'{total} Bilddatei(en) gefunden.')
+                    
+                    pending = set(futures)
+                    while pending:
+                        # Mit Timeout warten, damit gepufferte Log-Zeilen auch während
+                        # langer Photon-Anfragen oder ExifTool-Aufrufe erscheinen
+                        done, pending = wait(
+                            pending, timeout=self.LOG_FLUSH_INTERVAL, return_when=FIRST_COMPLETED
+                        )
+                        for future in done:
+                            future.result()
+                        
+                        if self.should_stop:
+                            break
+                        
+                        self._flush_log()
+                        self._report_progress(total)
+            finally:
+                # Bei Abbruch oder Fehler noch nicht begonnene Dateien verwerfen
+                executor.shutdown(cancel_futures=True)
+                # Endstand immer melden, auch wenn die letzte Meldung gedrosselt wurde
+                self.progress.emit(self._files_done, len(futures))
+            
+            if self.should_stop:
+                self._log('Abgebrochen.')
+            elif not futures:
+                self._log('Keine Bilddateien gefunden.')
+                self._flush_log()
+                self.finished.emit()
+                return
             
-            self.log.emit('\n' + '=' * 60)
-            self.log.emit('📊 Statistiken:')
-            self.log.emit(f'   Gefundene Dateien: {len(image_files)}')
-            self.log.emit(f'   Verarbeitete Dateien: {self.stats["total_processed"]}')
-            self.log.emit(f'   Übersprungen (bereits getaggt): {self.stats["skipped_already_tagged"]}')
-            self.log.emit(f'   Übersprungen (keine GPS): {self.stats["skipped_no_gps"]}')
-            self.log.emit(f'   Cache-Treffer: {self.stats["cache_hits"]}')
-            self.log.emit(f'   API-Aufrufe: {self.stats["api_calls"]}')
-            self.log.emit(f'   Metadaten geschrieben: {self.stats["metadata_written"]}')
-            self.log.emit(f'   Metadaten unverändert: {self.stats["metadata_unchanged"]}')
+            self._log('\n' + '=' * 60)
+            self._log('📊 Statistiken:')
+            self._log(f'   Gefundene Dateien: {total}')
+            self._log(f'   Verarbeitete Dateien: {self.stats["total_processed"]}')
+            self._log(f'   Übersprungen (bereits getaggt): {self.stats["skipped_already_tagged"]}')
+            self._log(f'   Übersprungen (keine GPS): {self.stats["skipped_no_gps"]}')
+            self._log(f'   Cache-Treffer: {self.stats["cache_hits"]}')
+            self._log(f'   API-Aufrufe: {self.stats["api_calls"]}')
+            self._log(f'   Metadaten geschrieben: {self.stats["metadata_written"]}')
+            self._log(f'   Metadaten unverändert: {self.stats["metadata_unchanged"]}')
             
             if self.stats['total_processed'] > 0:
                 cache_rate = (self.stats['cache_hits'] / self.stats['total_processed']) * 100
-                self.log.emit(f'   Cache-Trefferquote: {cache_rate:.1f}%')
+                self._log(f'   Cache-Trefferquote: {cache_rate:.1f}%')
             
-            self.log.emit('=' * 60)
+            self._log('=' * 60)
             
+            self.cache.flush()
             self.cache_stats.emit(self.stats)
-            self.log.emit('\nFertig!')
+            self._log('\nFertig!')
+            self._flush_log()
             self.finished.emit()
             
         except Exception as e:
+            self._flush_log()
             self.error.emit(f'Fehler: {str(e)}')
+        finally:
+            for session in self._sessions:
+                session.close()
+            if self.http is not None:
+                self.http.close()
+    
+    def _create_http_session(self) -> 'requests.Session':
+        # requests erst hier laden, damit das Hauptfenster schneller erscheint
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        
+        max_retry_after = self.MAX_RETRY_AFTER
+        
+        class CappedRetry(Retry):
+            def get_retry_after(self, response):
+                retry_after = super().get_retry_after(response)
+                return None if retry_after is None else min(retry_after, max_retry_after)
+        
+        # Keep-Alive: TCP- und TLS-Verbindung zu Photon für alle Anfragen wiederverwenden
+        http = requests.Session()
+        http.headers.update({'User-Agent': self.USER_AGENT})
+        adapter = HTTPAdapter(
+            pool_connections=self.MAX_WORKERS,
+            pool_maxsize=self.MAX_WORKERS,
+            # Nur bei 429/5xx mit wachsendem Abstand wiederholen und Retry-After beachten;
+            # alle anderen Fehler (offline, Timeout, SSL, Weiterleitung) sofort melden
+            max_retries=CappedRetry(
+                total=5,
+                connect=0,
+                read=0,
+                other=0,
+                redirect=0,
+                status=5,
+                backoff_factor=1,
+                status_forcelist=[429, 502, 503, 504],
+                allowed_methods=['GET'],
+                respect_retry_after_header=True
+            )
+        )
+        http.mount('https://', adapter)
+        return http
+    
+    @property
+    def exiftool(self) -> ExifToolSession:
+        # Eine ExifTool-Sitzung pro Thread, da das Protokoll nicht nebenläufig ist
+        session = getattr(self._local, 'exiftool', None)
+        if session is None:
+            session = ExifToolSession(self.config.get_exiftool_path())
+            self._local.exiftool = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+    
+    def _file_done(self, future: Future):
+        # Beim Abbruch verworfene Dateien nicht als erledigt zählen
+        if future.cancelled():
+            return
+        with self._lock:
+            self._files_done += 1
+    
+    def _report_progress(self, total: int):
+        now = time.monotonic()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self.progress.emit(self._files_done, total)
+            self._last_progress = now
+    
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+    
+    def _log(self, message: str):
+        lines = getattr(self._local, 'lines', None)
+        if lines is not None:
+            lines.append(message)
+        else:
+            self._append_log([message])
+    
+    def _append_log(self, lines: List[str]):
+        with self._lock:
+            self._log_buffer.extend(lines)
+            self._flush_log_if_due()
     
-    def find_image_files(self) -> List[Path]:
-        image_files = []
+    def _flush_log_if_due(self):
+        if time.monotonic() - self._last_log_flush >= self.LOG_FLUSH_INTERVAL:
+            self._flush_log()
+    
+    def _flush_log(self):
+        with self._lock:
+            if self._log_buffer:
+                self.log.emit('\n'.join(self._log_buffer))
+                self._log_buffer.clear()
+            self._last_log_flush = time.monotonic()
+    
+    def find_image_files(self) -> Iterator[str]:
         file_types = self.config.get_file_types()
+        # Übliche Schreibweisen vorab, damit endswith ohne lower() auskommt
+        suffixes = tuple(file_types | {file_type.upper() for file_type in file_types})
+        return self._walk(self.directory, file_types, suffixes)
+    
+    def _walk(self, directory: str, file_types: FrozenSet[str], suffixes: Tuple[str, ...]) -> Iterator[str]:
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            # Wie os.walk: unlesbare Verzeichnisse überspringen
+            return
         
-        for root, dirs, files in os.walk(self.directory):
-            for file in files:
-                if any(file.lower().endswith(ft) for ft in file_types):
-                    image_files.append(Path(root) / file)
-        
-        return image_files
+        # Sidecars aus dem Verzeichnislisting übernehmen statt pro Bild nachzufragen
+        # Groß-/Kleinschreibung ignorieren, z.B. IMG.JPG.XMP unter Windows und macOS
+        sidecars = {}
+        for entry in entries:
+            name = entry.name.lower()
+            if name.endswith('.xmp'):
+                sidecars[name] = entry
+        
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from self._walk(entry.path, file_types, suffixes)
+            elif entry.is_file():
+                # Wie os.walk: verlinkte Dateien mitnehmen, verlinkte Ordner nicht betreten
+                if (entry.name.endswith(suffixes)
+                        or os.path.splitext(entry.name)[1].lower() in file_types):
+                    sidecar = sidecars.get(entry.name.lower() + '.xmp')
+                    if sidecar is not None:
+                        self._sidecars[entry.path] = (sidecar.path, self._is_newer(sidecar, entry))
+                    # Path erst bei der Verarbeitung erzeugen
+                    yield entry.path
     
-    def check_existing_location_data(self, image_path: Path) -> bool:
+    @staticmethod
+    def _is_newer(entry: os.DirEntry, other: os.DirEntry) -> bool:
         try:
-            result = subprocess.run(
-                [
-                    self.config.get_exiftool_path(),
-                    '-IPTC:City',
-                    '-XMP:City',
-                    '-s3',
-                    str(image_path)
-                ],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            output = result.stdout.strip()
-            return bool(output)
-            
-        except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
+            return entry.stat().st_mtime > other.stat().st_mtime
+        except OSError:
             return False
     
-    def get_gps_data(self, image_path: Path) -> Optional[Tuple[float, float]]:
-        xmp_path = image_path.with_suffix(image_path.suffix + '.xmp')
-        
-        use_xmp = False
-        if xmp_path.exists():
-            image_mtime = image_path.stat().st_mtime
-            xmp_mtime = xmp_path.stat().st_mtime
-            if xmp_mtime > image_mtime:
-                use_xmp = True
-                self.log.emit(f'  → XMP-Sidecar ist neuer')
+    def read_image_state(self, image_path: Path,
+                         newer_xmp_path: Optional[str]) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        if newer_xmp_path:
+            self._log(f'  → XMP-Sidecar ist neuer')
         
-        file_to_read = xmp_path if use_xmp else image_path
+        # Vorhandene Ortsdaten und GPS in einem ExifTool-Aufruf lesen,
+        # bei neuerem Sidecar beide Dateien zusammen
+        files = [str(image_path), newer_xmp_path] if newer_xmp_path else [str(image_path)]
         
         try:
-            result = subprocess.run(
-                [
-                    self.config.get_exiftool_path(),
-                    '-GPSLatitude',
-                    '-GPSLongitude',
-                    '-n',
-                    str(file_to_read)
-                ],
-                capture_output=True,
-                text=True,
+            output = self.exiftool.execute(
+                '-fast',
+                '-j',
+                '-n',
+                '-IPTC:City',
+                '-XMP:City',
+                '-GPSLatitude',
+                '-GPSLongitude',
+                *files,
                 timeout=10
             )
-            
-            if result.returncode != 0:
-                return None
-            
-            lat, lon = None, None
-            for line in result.stdout.split('\n'):
-                if 'GPS Latitude' in line:
-                    try:
-                        lat = float(line.split(':')[1].strip())
-                    except (IndexError, ValueError):
-                        pass
-                elif 'GPS Longitude' in line:
-                    try:
-                        lon = float(line.split(':')[1].strip())
-                    except (IndexError, ValueError):
-                        pass
-            
-            if lat is not None and lon is not None:
-                return (lat, lon)
-            
         except subprocess.TimeoutExpired:
-            self.log.emit(f'  ⚠ Timeout beim Lesen')
+            self._log(f'  ⚠ Timeout beim Lesen')
+            return False, None
         except FileNotFoundError:
-            self.log.emit('  ⚠ ExifTool nicht gefunden')
+            self._log('  ⚠ ExifTool nicht gefunden')
+            return False, None
         except Exception as e:
-            self.log.emit(f'  ⚠ Fehler: {str(e)}')
+            self._log(f'  ⚠ Fehler: {str(e)}')
+            return False, None
         
-        return None
+        tags = self._parse_tags(output)
+        has_location = bool(tags.get(self._file_key(files[0]), {}).get('City'))
+        
+        gps_tags = tags.get(self._file_key(files[-1]), {})
+        try:
+            gps_data = (float(gps_tags['GPSLatitude']), float(gps_tags['GPSLongitude']))
+        except (KeyError, TypeError, ValueError):
+            gps_data = None
+        
+        return has_location, gps_data
     
-    def compare_location_data(self, image_path: Path, new_location: Dict[str, str]) -> bool:
+    @classmethod
+    def _parse_tags(cls, output: str) -> Dict[str, Dict[str, object]]:
         try:
-            result = subprocess.run(
-                [
-                    self.config.get_exiftool_path(),
-                    '-IPTC:City',
-                    '-IPTC:Province-State',
-                    '-IPTC:Country-PrimaryLocationName',
-                    '-s3',
-                    str(image_path)
-                ],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            lines = result.stdout.strip().split('\n')
-            existing_city = lines[0] if len(lines) > 0 else ''
-            existing_state = lines[1] if len(lines) > 1 else ''
-            existing_country = lines[2] if len(lines) > 2 else ''
-            
-            new_city = new_location.get('city', '')
-            new_state = new_location.get('state', '')
-            new_country = new_location.get('country', '')
-            
-            if (existing_city == new_city and 
-                existing_state == new_state and 
-                existing_country == new_country):
-                return False
-            
-            return True
-            
-        except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
-            return True
+            results = jsonutil.loads(output)
+        except jsonutil.JSONDecodeError:
+            # Keine lesbare Datei: ExifTool gibt dann kein JSON aus
+            return {}
+        return {cls._file_key(result.get('SourceFile', '')): result for result in results}
+    
+    @staticmethod
+    def _file_key(path: str) -> str:
+        # ExifTool gibt SourceFile auch unter Windows mit / als Trenner aus
+        return os.path.normcase(os.path.normpath(path))
     
     def reverse_geocode(self, lat: float, lon: float) -> Optional[Dict[str, str]]:
+        # Auf die Cache-Genauigkeit runden, damit nahe beieinander aufgenommene
+        # Bilder denselben Eintrag und dieselbe Photon-Anfrage teilen
+        decimals = self.cache.precision
+        gps = (lat, lon)
+        lat, lon = round(lat, decimals), round(lon, decimals)
+        
+        with self._lock:
+            future = self._locations.get((lat, lon))
+            is_first = future is None
+            if is_first:
+                future = Future()
+                self._locations[(lat, lon)] = future
+        
+        if not is_first:
+            # Dieselbe Position wurde in diesem Lauf schon (oder wird gerade) abgefragt
+            location = future.result()
+            if location:
+                self._log(f'  💾 Cache-Treffer')
+                self._count('cache_hits')
+            return location
+        
+        location = None
+        try:
+            location = self._lookup_location(lat, lon, gps)
+        finally:
+            if not location:
+                # Fehlgeschlagene Abfragen bei späteren Bildern erneut versuchen
+                with self._lock:
+                    del self._locations[(lat, lon)]
+            future.set_result(location)
+        return location
+    
+    def _lookup_location(self, lat: float, lon: float, gps: Tuple[float, float]) -> Optional[Dict[str, str]]:
         cached_data = self.cache.get(lat, lon)
         if cached_data:
-            self.log.emit(f'  💾 Cache-Treffer')
-            self.stats['cache_hits'] += 1
+            self._log(f'  💾 Cache-Treffer')
+            self._count('cache_hits')
             return cached_data
         
-        self.log.emit(f'  🌐 Photon API Abfrage...')
-        self.stats['api_calls'] += 1
+        # Höchstens eine Anfrage gleichzeitig an Photon, wie bisher im seriellen Ablauf
+        with self._api_lock:
+            return self._fetch_location(lat, lon, gps)
+    
+    def _fetch_location(self, lat: float, lon: float, gps: Tuple[float, float]) -> Optional[Dict[str, str]]:
+        import requests
+        
+        self._log(f'  🌐 Photon API Abfrage...')
+        self._count('api_calls')
         
         try:
-            url = 'https://photon.komoot.io/reverse'
             params = {
                 'lat': lat,
                 'lon': lon,
                 'lang': 'de'
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self.http.get(self.PHOTON_URL, params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -256,21 +436,55 @@ class GeocodingWorker(QThread):
                     'countrycode': props.get('countrycode', ''),
                 }
                 
-                self.cache.set(lat, lon, location_data)
+                # Gerundete Position als Schlüssel, ungerundete GPS-Werte für die Koordinaten-Spalten
+                self.cache.set(lat, lon, location_data, gps)
                 
                 return location_data
         
         except requests.RequestException as e:
-            self.log.emit(f'  ⚠ API Fehler: {str(e)}')
+            self._log(f'  ⚠ API Fehler: {str(e)}')
         except Exception as e:
-            self.log.emit(f'  ⚠ Fehler: {str(e)}')
+            self._log(f'  ⚠ Fehler: {str(e)}')
         
         return None
     
-    def write_location_data(self, image_path: Path, location: Dict[str, str]):
-        xmp_path = image_path.with_suffix(image_path.suffix + '.xmp')
+    def write_location_data(self, image_path: Path, location: Dict[str, str],
+                            xmp_path: Optional[str]) -> bool:
+        # Bild und Sidecar in einem Aufruf schreiben
+        files = [str(image_path), xmp_path] if xmp_path else [str(image_path)]
+        args = self._write_args(tuple(sorted(location.items())))
+        
+        try:
+            output = self.exiftool.execute(*args, *files, timeout=30)
+            
+            files_updated = self._files_updated(output)
+            if files_updated > 0:
+                self._log(f'  ✓ Metadaten geschrieben')
+                self._count('metadata_written')
+                
+                if xmp_path and files_updated > 1:
+                    self._log(f'  ✓ XMP-Sidecar aktualisiert')
+                return True
+            elif self._files_failed_condition(output) > 0 or self._files_unchanged(output) > 0:
+                self._log('  ⏭️  Daten bereits korrekt')
+                self._count('metadata_unchanged')
+                return True
+            else:
+                self._log(f'  ⚠ ExifTool Fehler')
+        
+        except subprocess.TimeoutExpired:
+            self._log(f'  ⚠ Timeout')
+        except Exception as e:
+            self._log(f'  ⚠ Fehler: {str(e)}')
         
-        args = [self.config.get_exiftool_path()]
+        return False
+    
+    @classmethod
+    @functools.lru_cache(maxsize=1024)
+    def _write_args(cls, location_items: Tuple[Tuple[str, str], ...]) -> Tuple[str, ...]:
+        # Bilder eines Ortes teilen dieselben Argumente, nur die Dateien unterscheiden sich
+        location = dict(location_items)
+        args = []
         
         if location.get('country'):
             args.extend([
@@ -332,63 +546,92 @@ class GeocodingWorker(QThread):
                 f'-XMP-iptcExt:LocationShownCity={location["name"]}'
             ])
         
+        # Unveränderte Dateien überspringt ExifTool selbst, statt sie vorher auszulesen.
+        # Geprüft werden die XMP-Felder, da nur diese auch im Sidecar stehen.
         args.extend([
+            '-if',
+            'not ($XMP-photoshop:City eq {} and $XMP-photoshop:State eq {} '
+            'and $XMP-photoshop:Country eq {})'.format(
+                cls._perl_quote(location.get('city', '')),
+                cls._perl_quote(location.get('state', '')),
+                cls._perl_quote(location.get('country', ''))
+            ),
             '-overwrite_original',
             '-P',
-            '-codedcharacterset=utf8',
-            str(image_path)
+            '-codedcharacterset=utf8'
         ])
         
+        return tuple(args)
+    
+    @staticmethod
+    def _files_updated(output: str) -> int:
+        # Im -stay_open-Modus gibt es keinen Exit-Code, nur die Zusammenfassung
+        match = re.search(r'(\d+) image files? updated', output)
+        return int(match.group(1)) if match else 0
+    
+    @staticmethod
+    def _files_unchanged(output: str) -> int:
+        # Bedingung erfüllt, aber kein Tag zu schreiben (z.B. leeres Feld im neuen Ort)
+        match = re.search(r'(\d+) image files? unchanged', output)
+        return int(match.group(1)) if match else 0
+    
+    @staticmethod
+    def _files_failed_condition(output: str) -> int:
+        match = re.search(r'(\d+) files? failed condition', output)
+        return int(match.group(1)) if match else 0
+    
+    @staticmethod
+    def _perl_quote(value: str) -> str:
+        # Werte als Perl-String in Hochkommas für die -if-Bedingung
+        return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+    
+    def process_image(self, image_file: str):
+        # Ausgaben pro Datei sammeln, damit sie bei parallelen Threads zusammenbleiben
+        self._local.lines = []
         try:
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                self.log.emit(f'  ✓ Metadaten geschrieben')
-                self.stats['metadata_written'] += 1
-                
-                if xmp_path.exists():
-                    xmp_args = args.copy()
-                    xmp_args[-1] = str(xmp_path)
-                    subprocess.run(xmp_args, capture_output=True, timeout=30)
-                    self.log.emit(f'  ✓ XMP-Sidecar aktualisiert')
-            else:
-                self.log.emit(f'  ⚠ ExifTool Fehler')
-        
-        except subprocess.TimeoutExpired:
-            self.log.emit(f'  ⚠ Timeout')
-        except Exception as e:
-            self.log.emit(f'  ⚠ Fehler: {str(e)}')
+            self._process_image(Path(image_file), self._sidecars.get(image_file))
+        finally:
+            lines = self._local.lines
+            self._local.lines = None
+            self._append_log(lines)
     
-    def process_image(self, image_path: Path):
-        self.log.emit(f'\n📷 {image_path.name}')
+    def _process_image(self, image_path: Path, sidecar: Optional[Tuple[str, bool]]):
+        self._log(f'\n📷 {image_path.name}')
+        xmp_path, xmp_newer = sidecar if sidecar is not None else (None, False)
+        
+        if self.skip_existing:
+            # Unveränderte, schon als getaggt bekannte Bilder nicht erneut auslesen
+            file_state = self._file_state(image_path)
+            if file_state is not None and self.cache.is_tagged(str(image_path), *file_state):
+                self._log('  ⏭️  Bereits getaggt')
+                self._count('skipped_already_tagged')
+                return
         
-        if self.skip_existing and self.check_existing_location_data(image_path):
-            self.log.emit('  ⏭️  Bereits getaggt')
-            self.stats['skipped_already_tagged'] += 1
-            return
+        has_location, gps_data = self.read_image_state(image_path, xmp_path if xmp_newer else None)
         
-        gps_data = self.get_gps_data(image_path)
+        if has_location:
+            self._remember_tagged(image_path)
+        
+        if self.skip_existing and has_location:
+            self._log('  ⏭️  Bereits getaggt')
+            self._count('skipped_already_tagged')
+            return
         
         if not gps_data:
-            self.log.emit('  ⊘ Keine GPS-Daten')
-            self.stats['skipped_no_gps'] += 1
+            self._log('  ⊘ Keine GPS-Daten')
+            self._count('skipped_no_gps')
             return
         
         lat, lon = gps_data
-        self.log.emit(f'  📍 GPS: {lat:.6f}, {lon:.6f}')
+        self._log(f'  📍 GPS: {lat:.6f}, {lon:.6f}')
         
         location = self.reverse_geocode(lat, lon)
         
         if not location:
-            self.log.emit('  ⊘ Keine Ortsdaten gefunden')
+            self._log('  ⊘ Keine Ortsdaten gefunden')
             return
         
-        self.stats['total_processed'] += 1
+        self._count('total_processed')
         
         location_parts = []
         if location.get('street'):
@@ -419,14 +662,23 @@ class GeocodingWorker(QThread):
             location_parts.append(country_display)
         
         location_str = ', '.join(filter(None, location_parts))
-        self.log.emit(f'  🌍 {location_str}')
+        self._log(f'  🌍 {location_str}')
         
-        if not self.compare_location_data(image_path, location):
-            self.log.emit('  ⏭️  Daten bereits korrekt')
-            self.stats['metadata_unchanged'] += 1
-            return
-        
-        self.write_location_data(image_path, location)
+        if self.write_location_data(image_path, location, xmp_path) and location.get('city'):
+            self._remember_tagged(image_path)
+    
+    @staticmethod
+    def _file_state(image_path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _remember_tagged(self, image_path: Path):
+        file_state = self._file_state(image_path)
+        if file_state is not None:
+            self.cache.set_tagged(str(image_path), *file_state)
     
     def stop(self):
         self.should_stop = True
\ No newline at end of file